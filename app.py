@@ -1,4 +1,10 @@
 import os
+import gzip
+import queue
+import atexit
+import logging
+import logging.handlers
+
 from bert import EnhancedSTEMTutorBot
 
 # --------------------------------------------------------------------------
@@ -7,35 +13,130 @@ from bert import EnhancedSTEMTutorBot
 
 try:
     # Attempt to import all dependencies required by the user's chatbot
-    from flask import Flask, request, jsonify, render_template_string
+    from flask import Flask, Response, request, jsonify, send_from_directory
+    from flask.json.provider import JSONProvider
+    from werkzeug.exceptions import RequestEntityTooLarge
+    import orjson
 except ImportError as e:
     print(f"FATAL ERROR: Missing required library: {e}")
-    print("Please run: pip install Flask transformers torch datasets sentence-transformers numpy")
+    print("Please run: pip install Flask orjson transformers torch datasets sentence-transformers numpy")
+
+# Log records are handed to a queue and written to stderr by a background
+# thread, so request threads never block on console I/O. Installed on the root
+# logger before the app is created, so Flask and Werkzeug use it instead of
+# attaching their own stream handlers.
+LOG_QUEUE = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(LOG_QUEUE, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(LOG_QUEUE))
+# With a root handler in place Werkzeug no longer sets its own level, and the root's
+# WARNING default would hide the dev server's per-request access lines.
+logging.getLogger('werkzeug').setLevel(logging.INFO)
 
 
 # --------------------------------------------------------------------------
 # 2. FLASK APPLICATION AND BOT INSTANCE
 # --------------------------------------------------------------------------
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by the orjson C extension."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Compress JSON answers (long explanations shrink several times over) when
+# flask-compress is installed. Brotli is preferred, gzip is the fallback.
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 256
+try:
+    from flask_compress import Compress
+    Compress(app)
+except ImportError:
+    pass
 
 # Initialize the Bot Globally
 STEM_BOT = EnhancedSTEMTutorBot()
 
+# Run a throwaway question through the bot before serving, so tokenizer setup,
+# kernel selection and allocator warm-up happen now rather than on the first
+# user's request. Every strategy uses the same encoder, so one question is enough.
+WARMUP_QUESTION = "What is photosynthesis?"
+
+try:
+    STEM_BOT.chat(WARMUP_QUESTION)
+except Exception as e:
+    print(f"⚠️ Warm-up failed: {e}")
+finally:
+    STEM_BOT.conversation_history.clear()
+
+NO_ANSWER = "I'm still learning and don't have an answer for that yet."
+
+# Longest message accepted by /api/chat. Questions are short; anything longer
+# only makes the encoder slower without improving the match.
+MAX_MESSAGE_LENGTH = 512
+# Largest /api/chat request body read. Comfortably fits a maximum-length
+# message even when every character is JSON-escaped. Also set as Flask's
+# MAX_CONTENT_LENGTH so chunked bodies without a Content-Length are bounded too.
+MAX_REQUEST_BYTES = 4096
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
 # --------------------------------------------------------------------------
 # 3. EMBEDDED HTML/CSS/JS FRONTEND
 # --------------------------------------------------------------------------
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-HTML_PATH = os.path.join(BASE_DIR, "templates", "index.html")
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
+# The page has no template variables, so it is sent straight from disk.
+# send_from_directory hands the open file to the server's wsgi.file_wrapper
+# (sendfile(2) where supported) and answers If-None-Match/If-Modified-Since
+# with a 304 using its own ETag and Last-Modified headers.
+HTML_CACHE_SECONDS = 3600
 
-with open(HTML_PATH, "r", encoding="utf-8") as f:
-    HTML_TEMPLATE = f.read()
 
-@app.route("/")
-def home():
-    return HTML_TEMPLATE
+def precompress_index():
+    """Write compressed copies of index.html next to it, once per page edit.
+
+    Returns a dict mapping Content-Encoding to file name, best first. Brotli is
+    only produced when the `brotli` package (a flask-compress dependency) is
+    available.
+    """
+    source = os.path.join(TEMPLATES_DIR, "index.html")
+    with open(source, "rb") as f:
+        page = f.read()
+
+    compressors = []
+    try:
+        import brotli
+        compressors.append(('br', "index.html.br", lambda data: brotli.compress(data, quality=11)))
+    except ImportError:
+        pass
+    compressors.append(('gzip', "index.html.gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+
+    variants = {}
+    for encoding, name, compress in compressors:
+        path = os.path.join(TEMPLATES_DIR, name)
+        try:
+            if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+                with open(path, "wb") as f:
+                    f.write(compress(page))
+            variants[encoding] = name
+        except OSError as e:
+            print(f"⚠️ Could not write {name}: {e}")
+    return variants
+
+
+HTML_VARIANTS = precompress_index()
 
 # --------------------------------------------------------------------------
 # 4. FLASK ROUTES
@@ -44,26 +145,56 @@ def home():
 @app.route('/')
 def index():
     """Route to serve the main chat interface."""
-    return render_template_string(HTML_TEMPLATE)
+    # best_match honours q-values, including q=0 refusals; ties go to the first (best) variant
+    encoding = request.accept_encodings.best_match(list(HTML_VARIANTS))
+    if encoding:
+        response = send_from_directory(TEMPLATES_DIR, HTML_VARIANTS[encoding], mimetype="text/html",
+                                       max_age=HTML_CACHE_SECONDS)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(TEMPLATES_DIR, "index.html", max_age=HTML_CACHE_SECONDS)
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """API route to receive user messages and send back chatbot responses."""
     try:
-        data = request.get_json()
+        try:
+            raw = request.get_data(cache=False, parse_form_data=False)
+        except RequestEntityTooLarge:
+            return jsonify({'error': 'Request too large'}), 413
+
+        try:
+            data = orjson.loads(raw) if raw else {}
+        except orjson.JSONDecodeError:
+            return jsonify({'error': 'Invalid JSON'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+
         user_message = data.get('message', '')
+        if not isinstance(user_message, str):
+            return jsonify({'error': 'Message must be a string'}), 400
 
         if not user_message:
             return jsonify({'error': 'No message provided'}), 400
 
+        if len(user_message) > MAX_MESSAGE_LENGTH:
+            return jsonify({
+                'error': 'Message too long',
+                'response': f'Please keep your question under {MAX_MESSAGE_LENGTH} characters.'
+            }), 400
+
+        # Repeated questions are answered from the bot's own exact-text cache
         response_dict = STEM_BOT.chat(user_message)
         
-        return jsonify({
-            'response': response_dict.get('answer', "I'm still learning and don't have an answer for that yet.")
-        })
+        return Response(orjson.dumps({
+            'response': response_dict.get('answer', NO_ANSWER),
+            'confidence': float(response_dict.get('confidence', 0.0))
+        }), mimetype='application/json')
 
     except Exception as e:
-        app.logger.error(f"An error occurred in the chat API: {e}")
+        app.logger.error("An error occurred in the chat API: %s", e, exc_info=True)
         return jsonify({'error': 'Internal Server Error', 'response': 'A severe server error occurred while processing your request.'}), 500
 
 # --------------------------------------------------------------------------
@@ -71,5 +202,10 @@ def chat():
 # --------------------------------------------------------------------------
 
 if __name__ == '__main__':
+    # Development server only. Requests are handled on separate threads so one
+    # slow inference does not block everyone else; the model is loaded once
+    # above and shared. For production run a single process with several
+    # threads, e.g. `gunicorn -w 1 --threads 8 app:app`, so every thread keeps
+    # using the same in-memory STEM_BOT.
     print("Running Flask STEM Tutor Bot. This may take a minute for model initialization...")
-    app.run(debug=True, threaded=False)
\ No newline at end of file
+    app.run(debug=False, threaded=True)
\ No newline at end of file
@@ -5,17 +5,386 @@ Features: Multiple datasets, expanded knowledge base, semantic search, step-by-s
 Requirements:
 pip install transformers torch datasets sentence-transformers numpy
 """
-from transformers import pipeline, AutoTokenizer
-from datasets import load_dataset
-from sentence_transformers import SentenceTransformer, util
+import os
+
+# Size the OpenMP/MKL thread pools to the physical core count. This has to happen
+# before torch is first imported (below); hyperthreads only add
+# contention for transformer inference. Explicit settings in the environment win.
+try:
+    import psutil
+    PHYSICAL_CORES = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+except ImportError:
+    PHYSICAL_CORES = os.cpu_count() or 1
+os.environ.setdefault('OMP_NUM_THREADS', str(PHYSICAL_CORES))
+os.environ.setdefault('MKL_NUM_THREADS', str(PHYSICAL_CORES))
+
+# transformers, datasets and sentence_transformers take seconds to import, so
+# they are imported where they are first used rather than here.
+import torch
 import warnings
+import hashlib
+import math
+import platform
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 warnings.filterwarnings('ignore')
 
+try:
+    import faiss  # optional: SIMD inner-product search for the embedding indexes
+except ImportError:
+    faiss = None
+
+try:
+    import simsimd  # optional: SIMD similarity kernels when faiss is not installed
+except ImportError:
+    simsimd = None
+
+try:
+    import numba  # optional: compiled scoring loop when neither faiss nor simsimd is installed
+except ImportError:
+    numba = None
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _dot_scores(matrix, query, out):
+        """out[i] = matrix[i] . query, rows split across threads"""
+        for i in numba.prange(matrix.shape[0]):
+            total = 0.0
+            for d in range(matrix.shape[1]):
+                total += matrix[i, d] * query[d]
+            out[i] = total
+    
+    # Request threads and the dataset search pool can score at the same time. Without
+    # TBB or OpenMP numba uses its 'workqueue' threading layer, which aborts the process
+    # when a parallel kernel is launched concurrently, so launches are serialized.
+    # Each launch already uses every core.
+    _DOT_SCORES_LOCK = threading.Lock()
+
+# Pure inference: no autograd on the importing thread (worker threads get
+# inference_mode() from chat()), one intra-op pool per physical core with no
+# separate inter-op pool, oneDNN for CPU matmuls, and no cuDNN autotuning since
+# input shapes change with every question.
+torch.set_grad_enabled(False)
+torch.set_num_threads(PHYSICAL_CORES)
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # Only settable once, before any inter-op work; keep whatever the host already chose
+    pass
+torch.backends.mkldnn.enabled = True
+torch.backends.cudnn.benchmark = False
+
+# Precomputed embeddings (and other derived model files) are cached here between runs
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "stembot")
+
+# Quantized kernels to try, best first: oneDNN/x86 use VNNI on recent Intel/AMD
+# CPUs, fbgemm is the older x86 backend and qnnpack covers ARM.
+QUANTIZED_ENGINES = ('onednn', 'x86', 'fbgemm', 'qnnpack')
+
+def compile_for_inference(module, device):
+    """Wrap a model in torch.compile for repeated inference
+    
+    Compilation happens on the first calls, so callers should run the result a
+    few times before serving. CUDA graphs ('reduce-overhead') only exist on the
+    GPU; dynamic=True avoids recompiling for every new input length.
+    """
+    mode = 'reduce-overhead' if device.type == 'cuda' else 'default'
+    return torch.compile(module, mode=mode, dynamic=True)
+
+def freeze_for_inference(module):
+    """Put a model in eval mode with gradients disabled on every parameter"""
+    module.eval()
+    for parameter in module.parameters():
+        parameter.requires_grad_(False)
+    return module
+
+def cpu_has_native_bf16():
+    """True when the CPU has bfloat16 matmul instructions (AMX or AVX512-BF16)"""
+    checks = ('_is_amx_tile_supported', '_is_avx512_bf16_supported')
+    return any(getattr(torch.cpu, name, lambda: False)() for name in checks)
+
+def quantize_dynamic_int8(module):
+    """Return module with its Linear layers dynamically quantized to INT8.
+
+    Returns the module unchanged when torch has no quantized CPU engine or
+    quantization fails.
+    """
+    supported = torch.backends.quantized.supported_engines
+    engine = next((e for e in QUANTIZED_ENGINES if e in supported), None)
+    if engine is None:
+        return module
+    try:
+        torch.backends.quantized.engine = engine
+        return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+    except Exception as e:
+        print(f"⚠️ INT8 quantization skipped: {e}")
+        return module
+
+# Ordinal/number words for "Newton's Nth law" questions, matched as whole words
+_LAW_NUMBERS = {
+    'first': 1, '1st': 1, 'one': 1, '1': 1,
+    'second': 2, '2nd': 2, 'two': 2, '2': 2,
+    'third': 3, '3rd': 3, 'three': 3, '3': 3
+}
+_LAW_NUMBER_RE = re.compile(r'\b(' + '|'.join(map(re.escape, _LAW_NUMBERS)) + r')\b')
+_WORD_RE = re.compile(r"[a-z]+")
+# Numbers (and number words) in a question; paraphrases that differ in these are different questions
+_NUMBER_TOKEN_RE = re.compile(r'\d+(?:\.\d+)?|\b(?:' + '|'.join(k for k in _LAW_NUMBERS if k.isalpha()) + r')\b')
+_NEWTON_LAW_TOPICS = {1: 'newtons_first_law', 2: 'newtons_second_law', 3: 'newtons_third_law'}
+
+# Topics suggested when nothing matched, for the detected subject or in general
+_SUBJECT_SUGGESTIONS = {
+    'physics': """• Newton's laws of motion
+• Kinetic and potential energy
+• Gravity and weight
+• Force, mass, and acceleration
+• Work and power""",
+    'chemistry': """• Atomic structure
+• Chemical bonding (ionic, covalent)
+• pH and acids/bases
+• Chemical reactions
+• The periodic table""",
+    'biology': """• Photosynthesis
+• Cellular respiration
+• DNA structure
+• Mitosis and meiosis
+• Cell structure""",
+    'math': """• Quadratic equations
+• Pythagorean theorem
+• Linear functions
+• Trigonometry basics
+• Algebra fundamentals"""
+}
+_DEFAULT_SUGGESTIONS = """• Physics: motion, energy, forces
+• Chemistry: atoms, bonding, reactions
+• Biology: cells, DNA, photosynthesis
+• Math: algebra, geometry, calculus"""
+
+# Answer text for dataset matches below the threshold, and for no match at all
+_RELATED_PREFIX = "⚠️ **Related information** (not an exact match):\n\n"
+_NO_MATCH_TEMPLATE = """I couldn't find specific information on that topic. 
+
+**Try asking about:**
+{suggestions}
+
+**Tips for better results:**
+• Be specific (e.g., "What is Newton's first law?" instead of "Tell me about physics")
+• Use standard terminology
+• Break complex questions into smaller parts"""
+
+def onnx_quantization_preset():
+    """Name of the ONNX Runtime dynamic quantization preset for this CPU"""
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return 'arm64'
+    if 'AVX512' in torch.backends.cpu.get_cpu_capability():
+        # AVX512 alone (e.g. Skylake-SP) lacks the VNNI dot-product instructions
+        if getattr(torch.cpu, '_is_avx512_vnni_supported', lambda: False)():
+            return 'avx512_vnni'
+        return 'avx512'
+    return 'avx2'
+
+def onnx_session_options():
+    """ONNX Runtime session options: full graph optimization, torch's thread count"""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = torch.get_num_threads()
+    return options
+
+def load_onnx_encoder(model_name):
+    """Load an INT8 ONNX Runtime copy of a sentence encoder.
+    
+    Exported and quantized on first use, then cached under CACHE_DIR.
+    Raises ImportError when optimum[onnxruntime] is not installed.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    
+    preset = onnx_quantization_preset()
+    model_dir = os.path.join(CACHE_DIR, "onnx", model_name.replace("/", "--"))
+    file_name = f"onnx/model_qint8_{preset}.onnx"
+    
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        print(f"📦 Exporting {model_name} to ONNX ({preset} INT8, one-time)...")
+        exported = SentenceTransformer(model_name, backend="onnx")
+        exported.save_pretrained(model_dir)
+        export_dynamic_quantized_onnx_model(exported, preset, model_dir)
+    
+    return SentenceTransformer(model_dir, backend="onnx", model_kwargs={
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+        "session_options": onnx_session_options(),
+    })
+
+def fit_pca_projection(matrix, dimensions):
+    """(mean, components) that project embeddings onto their top principal components"""
+    data = matrix.float()
+    mean = data.mean(dim=0)
+    _, _, vh = torch.linalg.svd(data - mean, full_matrices=False)
+    return mean, vh[:dimensions].T.contiguous()
+
+def _quantize_rows_int8(vectors):
+    """Scale each row so its largest component is +-127 and round to int8
+    
+    Cosine similarity ignores per-row scale, so no scale factors need keeping.
+    """
+    peak = np.abs(vectors).max(axis=1, keepdims=True)
+    scaled = vectors * (127.0 / np.maximum(peak, 1e-12))
+    return np.ascontiguousarray(np.rint(scaled).astype(np.int8))
+
+class EmbeddingIndex:
+    """Nearest-neighbour search over L2-normalized embeddings: FAISS, SimSIMD, Numba or torch"""
+    
+    HNSW_MIN_VECTORS = 10000
+    HNSW_M = 16  # graph neighbours per node
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+    IVF_MIN_VECTORS = 50000
+    IVF_NPROBE = 32
+    GPU_TEMP_MEMORY = 64 * 1024 * 1024  # FAISS scratch space per GPU index (default is far larger)
+    
+    def __init__(self, matrix, int8=False, projection=None):
+        self.projection = None
+        if projection is not None:
+            self.projection = tuple(t.to(matrix.device) for t in projection)
+            matrix = self._project(matrix)
+        self.size = matrix.shape[0]
+        self.matrix = None
+        self.vectors = None
+        self.faiss_index = None
+        self._gpu_lock = None
+        self.int8 = int8 and (faiss is not None or (simsimd is not None and matrix.device.type == 'cpu'))
+        
+        if faiss is not None:
+            self.backend = 'faiss'
+            vectors = np.ascontiguousarray(matrix.float().cpu().numpy())
+            faiss.normalize_L2(vectors)  # undo the small norm drift of float16 storage, once
+            dim = vectors.shape[1]
+            qtype = faiss.ScalarQuantizer.QT_8bit if int8 else faiss.ScalarQuantizer.QT_fp16
+            on_gpu = matrix.device.type == 'cuda' and hasattr(faiss, 'StandardGpuResources')
+            if self.size >= self.IVF_MIN_VECTORS:
+                nlist = int(4 * math.sqrt(self.size))
+                self._quantizer = faiss.IndexFlatIP(dim)  # must outlive the IVF index
+                self.faiss_index = faiss.IndexIVFScalarQuantizer(
+                    self._quantizer, dim, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+                self.faiss_index.nprobe = min(self.IVF_NPROBE, nlist)
+            elif self.size >= self.HNSW_MIN_VECTORS:
+                self.faiss_index = faiss.IndexHNSWSQ(dim, qtype, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+                self.faiss_index.hnsw.efConstruction = self.HNSW_EF_CONSTRUCTION
+                self.faiss_index.hnsw.efSearch = self.HNSW_EF_SEARCH
+            else:
+                self.faiss_index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+            self.faiss_index.train(vectors)
+            self.faiss_index.add(vectors)
+            if on_gpu and not self.HNSW_MIN_VECTORS <= self.size < self.IVF_MIN_VECTORS:
+                # Flat and IVF indexes have GPU versions; HNSW stays on the CPU
+                self._move_faiss_index_to_gpu(vectors, matrix.device.index or 0)
+        elif simsimd is not None and matrix.device.type == 'cpu':
+            self.backend = 'simsimd'
+            if self.int8:
+                self.vectors = _quantize_rows_int8(matrix.float().numpy())
+            else:
+                self.vectors = np.ascontiguousarray(matrix.half().numpy())
+        elif numba is not None and matrix.device.type == 'cpu':
+            self.backend = 'numba'
+            self.vectors = np.ascontiguousarray(matrix.float().numpy())
+            # JIT-compile (or load from numba's on-disk cache) now rather than on the first search
+            with _DOT_SCORES_LOCK:
+                _dot_scores(self.vectors[:1], self.vectors[0], np.empty(1, dtype=np.float32))
+        else:
+            self.backend = 'torch'
+            self.matrix = matrix.half() if matrix.device.type == 'cuda' else matrix.float()
+    
+    def __len__(self):
+        return self.size
+    
+    def _move_faiss_index_to_gpu(self, vectors, device):
+        """Replace the CPU FAISS index with a float16 copy on the given GPU, keeping it on failure"""
+        try:
+            resources = faiss.StandardGpuResources()
+            resources.setTempMemory(self.GPU_TEMP_MEMORY)
+            options = faiss.GpuClonerOptions()
+            options.useFloat16 = True
+            flat = not isinstance(self.faiss_index, faiss.IndexIVF)
+            index = self.faiss_index
+            if flat:
+                # GPU FAISS has no flat scalar-quantizer index; useFloat16 gives the same storage
+                index = faiss.IndexFlatIP(vectors.shape[1])
+                index.add(vectors)
+            self.faiss_index = faiss.index_cpu_to_gpu(resources, device, index, options)
+            self._gpu_resources = resources  # must outlive the GPU index
+            self._gpu_lock = threading.Lock()
+            if flat and self.int8:
+                print("⚠️ int8 index storage is not available on the GPU; using float16")
+        except Exception as e:
+            print(f"⚠️ Keeping FAISS index on the CPU: {e}")
+    
+    def _project(self, vectors):
+        """Vectors mapped onto the index's principal components, renormalized"""
+        if self.projection is None:
+            return vectors
+        mean, components = self.projection
+        return torch.nn.functional.normalize((vectors.float() - mean) @ components, dim=-1)
+    
+    def search(self, query):
+        """Return (row, score) of the row most similar to a normalized query vector"""
+        query = self._project(query)
+        if self.backend == 'faiss':
+            # Queries come from _encode_question already normalized
+            q = np.ascontiguousarray(query.float().cpu().numpy().reshape(1, -1))
+            if self._gpu_lock is not None:
+                with self._gpu_lock:
+                    scores, rows = self.faiss_index.search(q, 1)
+            else:
+                scores, rows = self.faiss_index.search(q, 1)
+            return int(rows[0, 0]), float(scores[0, 0])
+        
+        if self.backend == 'simsimd':
+            # Cosine distance rather than 'dot': its meaning is the same across SimSIMD versions
+            if self.int8:
+                q = _quantize_rows_int8(query.float().cpu().numpy().reshape(1, -1))
+            else:
+                q = np.ascontiguousarray(query.half().cpu().numpy().reshape(1, -1))
+            distances = np.asarray(simsimd.cdist(q, self.vectors, metric='cosine')).ravel()
+            row = int(distances.argmin())
+            return row, 1.0 - float(distances[row])
+        
+        if self.backend == 'numba':
+            scores = np.empty(self.size, dtype=np.float32)
+            with _DOT_SCORES_LOCK:
+                _dot_scores(self.vectors, np.ascontiguousarray(query.float().cpu().numpy()), scores)
+            row = int(scores.argmax())
+            return row, float(scores[row])
+        
+        scores = torch.mv(self.matrix, query.to(self.matrix.dtype))
+        row = int(scores.argmax())
+        return row, float(scores[row])
+
 class EnhancedSTEMTutorBot:
     SIMILARITY_THRESHOLD = 0.45
     HIGH_CONFIDENCE_THRESHOLD = 0.65
+    SEMANTIC_MODEL_NAME = 'all-MiniLM-L6-v2'
+    SCIENCEQA_SEARCH_LIMIT = 3000  # ScienceQA questions searched (first N of the train split)
+    SCIQ_SEARCH_LIMIT = 2000  # SciQ questions searched (first N of the train split)
+    KB_MAX_SEQ_LENGTH = 64  # token cap when embedding KB topic summaries
+    QUESTION_CACHE_SIZE = 512  # recent question embeddings kept for reuse
+    EXACT_CACHE_SIZE = 1024  # recent answers reused for the same question text
+    ANSWER_CACHE_SIZE = 256  # recent answers reused for near-identical questions
+    ANSWER_CACHE_SIMILARITY = 0.95  # cosine similarity that counts as the same question
+    # Per-question tracing (strategy steps, matches, cache hits); set STEM_DEBUG=1 to enable
+    DEBUG = bool(os.environ.get('STEM_DEBUG'))
+    # Sentences of different lengths, so warm-up (and compilation) sees more than one input shape
+    WARMUP_SENTENCES = ["What is motion?", "How do I solve a quadratic equation with the formula?"]
+    # Store dataset indexes as int8 codes (FAISS/SimSIMD only): 4x smaller than float32,
+    # scores shift by about 0.01, which matters for matches near SIMILARITY_THRESHOLD
+    INT8_DATASET_INDEXES = False
+    # Project dataset embeddings onto this many principal components (None keeps all 384).
+    # Cuts search cost proportionally but shifts scores, so SIMILARITY_THRESHOLD needs re-tuning.
+    PCA_DIMENSIONS = None
+    # Corpus encode batch size (CPU, GPU): a GPU needs larger batches to keep its matmuls busy
+    CORPUS_BATCH_SIZE = (64, 128)
     
     def __init__(self):
         """Initialize models and datasets"""
@@ -27,37 +396,60 @@ class EnhancedSTEMTutorBot:
         # Load semantic similarity model
         print("📊 Loading semantic search model...")
         try:
-            self.semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
-            print("✅ Semantic model loaded!")
+            self.semantic_model = freeze_for_inference(self._load_semantic_model())
+            print(f"✅ Semantic model loaded! ({self.semantic_model.backend})")
         except Exception as e:
             print(f"⚠️ Semantic model failed: {e}")
             self.semantic_model = None
         
-        # Load QA model
-        print("\n🤖 Loading BERT QA model...")
-        model_name = "distilbert-base-cased-distilled-squad"
-        self.qa_pipeline = pipeline("question-answering", model=model_name, tokenizer=model_name)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        print("✅ BERT model loaded!")
+        compiled = False
+        try:
+            compiled = self._compile_semantic_model()
+            if compiled:
+                print("✅ Semantic model compiled")
+        except Exception as e:
+            print(f"⚠️ torch.compile skipped, using eager model: {e}")
+        
+        # Questions are encoded one at a time; run that shape now so the first real
+        # question does not pay for kernel selection and allocator warm-up
+        if self.semantic_model and not compiled:
+            try:
+                with torch.inference_mode():
+                    for sentence in self.WARMUP_SENTENCES:
+                        self._encode(sentence)
+            except Exception as e:
+                print(f"⚠️ Semantic model warm-up failed: {e}")
         
         # Load datasets
         self.datasets = {}
         self._load_datasets()
         
-        # Conversation context
+        # Dataset searches run side by side on these threads after a KB miss
+        self._search_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='stembot-search')
+        
+        # Conversation context (shared between request threads when served by Flask)
+        self._state_lock = threading.Lock()
         self.conversation_history = []
         self.max_history = 5
+        self._question_embeddings = OrderedDict()  # question -> normalized embedding, LRU order
+        self._exact_answers = OrderedDict()  # normalized question text -> result, LRU order
+        # Semantic answer cache: a ring buffer of answered question embeddings (allocated on
+        # first use) with a (numbers, result) entry per filled row
+        self._answer_cache_matrix = None
+        self._answer_cache_entries = []
+        self._answer_cache_next = 0
         self.last_subject = None
         self.last_topic = None
         
         # Initialize expanded knowledge base
         self.knowledge_base = self._build_comprehensive_kb()
+        self._flatten_knowledge_base()
         
         # Pre-encode knowledge base for semantic search
         if self.semantic_model:
-            print("\n🔍 Pre-encoding knowledge base for fast semantic search...")
+            print("\n🔍 Pre-encoding knowledge base and datasets for fast semantic search...")
             self._precompute_embeddings()
-            print("✅ Knowledge base indexed!")
+            print("✅ Knowledge base and datasets indexed!")
         
         # Subject detection keywords
         self.subject_keywords = {
@@ -75,11 +467,67 @@ class EnhancedSTEMTutorBot:
                     'function', 'graph', 'polynomial', 'trigonometry', 'sine', 'cosine',
                     'pythagorean', 'quadratic', 'linear', 'slope', 'angle', 'triangle']
         }
+        # Keywords (all single words) are matched as whole question tokens via set
+        # intersection, so short keywords like 'ph' or 'ion' never match inside
+        # 'graph' or 'motion'
+        self._subject_word_sets = {
+            subject: frozenset(keywords) for subject, keywords in self.subject_keywords.items()
+        }
         
         print("\n✨ Bot ready! All systems operational.\n")
     
+    def _compile_semantic_model(self):
+        """Compile the PyTorch sentence encoder and run it until the kernels are built
+        
+        The eager model is put back if compiling or warming up fails. Returns
+        False when there is no PyTorch encoder to compile.
+        """
+        model = self.semantic_model
+        if not model or model.backend != 'torch' or not hasattr(torch, 'compile'):
+            return False
+        
+        encoder = model._first_module()
+        eager = encoder.auto_model
+        encoder.auto_model = compile_for_inference(eager, model.device)
+        try:
+            with torch.inference_mode():
+                for _ in range(2):
+                    model.encode(self.WARMUP_SENTENCES)
+                    for sentence in self.WARMUP_SENTENCES:
+                        model.encode(sentence)
+        except Exception:
+            encoder.auto_model = eager
+            raise
+        return True
+    
+    def _load_semantic_model(self):
+        """Sentence encoder: FP16 PyTorch on GPU; INT8 ONNX Runtime, BF16 or INT8 PyTorch on CPU"""
+        from sentence_transformers import SentenceTransformer
+        
+        if torch.cuda.is_available():
+            # Half precision roughly doubles GPU throughput with no loss in retrieval quality;
+            # embeddings (and kb_matrix) then live on the GPU as well
+            return SentenceTransformer(self.SEMANTIC_MODEL_NAME, device='cuda').half()
+        
+        try:
+            return load_onnx_encoder(self.SEMANTIC_MODEL_NAME)
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"⚠️ ONNX Runtime encoder unavailable, using PyTorch: {e}")
+        
+        model = SentenceTransformer(self.SEMANTIC_MODEL_NAME, device='cpu')
+        if cpu_has_native_bf16():
+            # Native bfloat16 matmuls halve memory traffic without INT8's rounding error
+            return model.to(torch.bfloat16)
+        encoder = model._first_module()
+        encoder.auto_model = quantize_dynamic_int8(encoder.auto_model)
+        return model
+    
     def _load_datasets(self):
         """Load multiple STEM datasets"""
+        from datasets import load_dataset
+        
         print("\n📚 Loading datasets...\n")
         
         # ScienceQA
@@ -535,77 +983,192 @@ If a² + b² = c², then triangle IS a right triangle.
         }
         return kb
     
+    def _flatten_knowledge_base(self):
+        """Lay the nested knowledge base out as parallel per-topic lists
+        
+        Row i of every kb_* list (and of kb_matrix) describes the same topic, so
+        searches work with integer rows instead of walking the nested dicts.
+        """
+        self.kb_subjects = []
+        self.kb_topics = []
+        self.kb_contents = []
+        self.kb_summaries = []
+        for subject, topics in self.knowledge_base.items():
+            for topic_key, topic_data in topics.items():
+                self.kb_subjects.append(subject)
+                self.kb_topics.append(topic_key)
+                self.kb_contents.append(topic_data['content'])
+                # Embedded instead of the full content: the topic name, keywords and opening
+                # line carry the topic signal, the worked examples below only dilute it
+                summary = topic_data['content'].replace('**', '').split('\n', 1)[0][:200]
+                self.kb_summaries.append(f"{topic_key.replace('_', ' ')}. {' '.join(topic_data['keywords'])}. {summary}")
+        # Fixed from here on: tuples make accidental in-place edits (which would desync
+        # the rows from kb_matrix) an error
+        self.kb_subjects = tuple(self.kb_subjects)
+        self.kb_topics = tuple(self.kb_topics)
+        self.kb_contents = tuple(self.kb_contents)
+        self.kb_summaries = tuple(self.kb_summaries)
+        self.kb_rows = {topic_key: row for row, topic_key in enumerate(self.kb_topics)}
+    
+    @torch.inference_mode()
     def _precompute_embeddings(self):
         """Pre-encode knowledge base entries for fast semantic search"""
         if not self.semantic_model:
             return
         
-        self.kb_embeddings = {}
-        for subject, topics in self.knowledge_base.items():
-            self.kb_embeddings[subject] = {}
-            for topic_key, topic_data in topics.items():
-                text = f"{topic_key} {' '.join(topic_data['keywords'])} {topic_data['content']}"
-                embedding = self.semantic_model.encode(text, convert_to_tensor=True)
-                self.kb_embeddings[subject][topic_key] = embedding
+        # One batched encode for the whole KB; row i of kb_matrix is KB row i. The
+        # summaries are part of the cache key, so editing the KB re-encodes it.
+        kb_fingerprint = f"{self.KB_MAX_SEQ_LENGTH}|" + "\n".join(self.kb_summaries)
+        self.kb_matrix = self._cached_embeddings('kb', kb_fingerprint, self._encode_kb)
+        self.kb_embedding_index = EmbeddingIndex(self.kb_matrix)
+        
+        # Dataset questions are encoded once here instead of on every search
+        matrices = {}
+        if self.datasets.get('scienceqa'):
+            matrices['scienceqa'] = self._encode_dataset(
+                'scienceqa', self.datasets['scienceqa'], limit=self.SCIENCEQA_SEARCH_LIMIT)
+        for subject, ds in (self.datasets.get('mmlu') or {}).items():
+            matrices[f'mmlu_{subject}'] = self._encode_dataset(f'mmlu_{subject}', ds)
+        if self.datasets.get('sciq'):
+            matrices['sciq'] = self._encode_dataset('sciq', self.datasets['sciq'], limit=self.SCIQ_SEARCH_LIMIT)
+        
+        projection = None
+        if self.PCA_DIMENSIONS and matrices:
+            projection = fit_pca_projection(torch.cat(list(matrices.values())), self.PCA_DIMENSIONS)
+        
+        indexes = {name: EmbeddingIndex(matrix, int8=self.INT8_DATASET_INDEXES, projection=projection)
+                   for name, matrix in matrices.items()}
+        self.scienceqa_index = indexes.get('scienceqa')
+        self.mmlu_indexes = {name[len('mmlu_'):]: index for name, index in indexes.items()
+                             if name.startswith('mmlu_')}
+        self.sciq_index = indexes.get('sciq')
     
-    def detect_law_number(self, question):
-        """Detect which numbered law is being asked about"""
-        question_lower = question.lower()
+    def _encode_kb(self):
+        """Encode the KB summaries, truncated to KB_MAX_SEQ_LENGTH tokens"""
+        max_seq_length = self.semantic_model.max_seq_length
+        self.semantic_model.max_seq_length = self.KB_MAX_SEQ_LENGTH
+        try:
+            return self._encode_corpus(self.kb_summaries, batch_size=32)
+        finally:
+            self.semantic_model.max_seq_length = max_seq_length
+    
+    def _encode(self, texts, batch_size=32, show_progress_bar=False):
+        """Normalized embeddings of a text (vector) or list of texts (matrix)"""
+        embeddings = self.semantic_model.encode(texts, batch_size=batch_size, convert_to_tensor=True,
+                                                normalize_embeddings=True, show_progress_bar=show_progress_bar)
+        # NumPy, FAISS and SimSIMD have no bfloat16, so BF16 models hand back float32
+        return embeddings.float() if embeddings.dtype == torch.bfloat16 else embeddings
+    
+    def _encode_question(self, question):
+        """Normalized embedding of a question, reused for recently seen questions"""
+        with self._state_lock:
+            embedding = self._question_embeddings.get(question)
+            if embedding is not None:
+                self._question_embeddings.move_to_end(question)
+                return embedding
         
-        # Check for explicit numbers
-        number_words = {
-            'first': 1, '1st': 1, 'one': 1,
-            'second': 2, '2nd': 2, 'two': 2,
-            'third': 3, '3rd': 3, 'three': 3
-        }
+        embedding = self._encode(question)
         
-        for word, num in number_words.items():
-            if word in question_lower:
-                return num
+        with self._state_lock:
+            self._question_embeddings[question] = embedding
+            if len(self._question_embeddings) > self.QUESTION_CACHE_SIZE:
+                self._question_embeddings.popitem(last=False)
+        return embedding
+    
+    def _encode_corpus(self, texts, batch_size=None, show_progress_bar=False):
+        """Encode a list of texts into a normalized matrix, encoding each distinct text once"""
+        if batch_size is None:
+            batch_size = self.CORPUS_BATCH_SIZE[self.semantic_model.device.type == 'cuda']
+        unique_texts = list(dict.fromkeys(texts))
+        matrix = self._encode(unique_texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+        if len(unique_texts) == len(texts):
+            return matrix
         
-        # Check for digits
-        import re
-        digits = re.findall(r'\b([1-3])\b', question_lower)
-        if digits:
-            return int(digits[0])
+        row_of = {text: i for i, text in enumerate(unique_texts)}
+        rows = torch.tensor([row_of[text] for text in texts], device=matrix.device)
+        return matrix.index_select(0, rows)
+    
+    def _encode_dataset(self, name, dataset, limit=None):
+        """Encode a dataset's questions into a normalized matrix, cached on disk"""
+        count = len(dataset) if limit is None else min(limit, len(dataset))
+        questions = dataset.select_columns(['question'])[:count]['question']
         
-        return None
+        def encode():
+            print(f"  📐 Encoding {count} {name} questions (one-time)...")
+            return self._encode_corpus(questions, show_progress_bar=True)
+        
+        return self._cached_embeddings(name, "\n".join(questions), encode)
+    
+    def _encoder_signature(self):
+        """Backend, dtype and quantization of the sentence encoder, e.g. 'torch|torch.float16|fp'
+        
+        The same model produces slightly different vectors under FP16 CUDA, BF16 or
+        INT8 PyTorch and INT8 ONNX Runtime (whose kernels depend on the preset).
+        """
+        model = self.semantic_model
+        backend = getattr(model, 'backend', 'torch')
+        if backend == 'onnx':
+            return f"onnx|qint8|{onnx_quantization_preset()}"
+        parameter = next(model.parameters(), None)
+        dtype = parameter.dtype if parameter is not None else None
+        quantized = any('quantized' in type(module).__module__ for module in model.modules())
+        return f"{backend}|{dtype}|{'qint8' if quantized else 'fp'}"
+    
+    def _cached_embeddings(self, name, fingerprint, encode):
+        """Embedding matrix memory-mapped from CACHE_DIR, or from encode() and then saved there"""
+        key = hashlib.sha1(
+            f"{self.SEMANTIC_MODEL_NAME}|{self._encoder_signature()}|{fingerprint}".encode()).hexdigest()
+        cache_path = os.path.join(CACHE_DIR, f"{name}_{key[:16]}.npy")
+        
+        if os.path.exists(cache_path):
+            try:
+                # Copy-on-write mapping: writable for torch, but the file is never modified
+                matrix = torch.from_numpy(np.load(cache_path, mmap_mode='c'))
+                return matrix.to(self.semantic_model.device)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable embedding cache {cache_path}: {e}")
+        
+        # Stored as float16: half the disk and load time, and ranking is unaffected
+        matrix = encode().half()
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            np.save(cache_path, matrix.cpu().numpy())
+        except OSError as e:
+            print(f"⚠️ Could not cache {name} embeddings: {e}")
+        return matrix
+    
+    def detect_law_number(self, question):
+        """Detect which numbered law is being asked about"""
+        match = _LAW_NUMBER_RE.search(question.lower())
+        return _LAW_NUMBERS[match.group(1)] if match else None
     
     def semantic_search_kb(self, question):
-        """Use semantic similarity to find best KB match"""
+        """Use semantic similarity to find best KB match, as (row, score)"""
         if not self.semantic_model:
-            return None, None, 0
+            return None, 0
         
         # Special handling for numbered laws
-        law_num = self.detect_law_number(question)
-        if law_num and 'newton' in question.lower():
-            law_map = {
-                1: 'newtons_first_law',
-                2: 'newtons_second_law',
-                3: 'newtons_third_law'
-            }
-            if law_map.get(law_num):
-                print(f"🎯 Detected Newton's Law #{law_num} - direct match")
-                return 'physics', law_map[law_num], 0.95
-        
-        question_embedding = self.semantic_model.encode(question, convert_to_tensor=True)
+        law_row = self._newton_law_row(question)
+        if law_row is not None:
+            return law_row, 0.95
         
-        best_match = None
-        best_subject = None
-        best_score = 0
+        question_embedding = self._encode_question(question)
         
-        for subject, topics in self.kb_embeddings.items():
-            for topic_key, topic_embedding in topics.items():
-                similarity = util.cos_sim(question_embedding, topic_embedding).item()
-                if similarity > best_score:
-                    best_score = similarity
-                    best_match = topic_key
-                    best_subject = subject
+        best_row, best_score = self.kb_embedding_index.search(question_embedding)
         
         if best_score > self.SIMILARITY_THRESHOLD:
-            return best_subject, best_match, best_score
+            return best_row, best_score
         
-        return None, None, 0
+        return None, 0
+    
+    def _newton_law_row(self, question):
+        """KB row for "Newton's Nth law" questions, or None"""
+        law_num = self.detect_law_number(question)
+        if law_num and 'newton' in question.lower():
+            if self.DEBUG:
+                print(f"🎯 Detected Newton's Law #{law_num} - direct match")
+            return self.kb_rows[_NEWTON_LAW_TOPICS[law_num]]
+        return None
     
     def search_scienceqa(self, question):
         """Enhanced ScienceQA search with semantic similarity"""
@@ -613,30 +1176,21 @@ If a² + b² = c², then triangle IS a right triangle.
             return None
         
         try:
-            print("🔍 Searching ScienceQA dataset...")
+            if self.DEBUG:
+                print("🔍 Searching ScienceQA dataset...")
             
             best_match = None
             best_score = 0
             
-            # Use semantic search if available
-            if self.semantic_model:
-                question_embedding = self.semantic_model.encode(question, convert_to_tensor=True)
-                
-                # Sample subset for speed
-                for i, example in enumerate(self.datasets['scienceqa']):
-                    if i > 3000:
-                        break
-                    
-                    example_text = example['question']
-                    example_embedding = self.semantic_model.encode(example_text, convert_to_tensor=True)
-                    similarity = util.cos_sim(question_embedding, example_embedding).item()
-                    
-                    if similarity > best_score:
-                        best_score = similarity
-                        best_match = example
+            # Use semantic search against the precomputed question index
+            if self.semantic_model and self.scienceqa_index is not None:
+                question_embedding = self._encode_question(question)
+                best_row, best_score = self.scienceqa_index.search(question_embedding)
+                best_match = self.datasets['scienceqa'][best_row]
             
             if best_match and best_score > self.SIMILARITY_THRESHOLD:
-                print(f"✅ Found match (similarity: {best_score:.2%})")
+                if self.DEBUG:
+                    print(f"✅ Found match (similarity: {best_score:.2%})")
                 
                 choices = best_match.get('choices', [])
                 answer_idx = best_match.get('answer', 0)
@@ -672,7 +1226,8 @@ If a² + b² = c², then triangle IS a right triangle.
             return None
         
         try:
-            print("🔍 Searching MMLU dataset...")
+            if self.DEBUG:
+                print("🔍 Searching MMLU dataset...")
             
             # Determine which MMLU subject to search
             subjects_to_search = []
@@ -691,23 +1246,21 @@ If a² + b² = c², then triangle IS a right triangle.
             best_score = 0
             
             if self.semantic_model:
-                question_embedding = self.semantic_model.encode(question, convert_to_tensor=True)
+                question_embedding = self._encode_question(question)
                 
                 for subject in subjects_to_search:
-                    if subject not in self.datasets['mmlu']:
+                    if subject not in self.mmlu_indexes:
                         continue
                     
-                    for example in self.datasets['mmlu'][subject]:
-                        example_text = example['question']
-                        example_embedding = self.semantic_model.encode(example_text, convert_to_tensor=True)
-                        similarity = util.cos_sim(question_embedding, example_embedding).item()
-                        
-                        if similarity > best_score:
-                            best_score = similarity
-                            best_match = example
+                    row, score = self.mmlu_indexes[subject].search(question_embedding)
+                    
+                    if score > best_score:
+                        best_score = score
+                        best_match = self.datasets['mmlu'][subject][row]
             
             if best_match and best_score > self.SIMILARITY_THRESHOLD:
-                print(f"✅ Found in MMLU (similarity: {best_score:.2%})")
+                if self.DEBUG:
+                    print(f"✅ Found in MMLU (similarity: {best_score:.2%})")
                 
                 choices = best_match.get('choices', [])
                 answer_idx = best_match.get('answer', 0)
@@ -733,13 +1286,12 @@ If a² + b² = c², then triangle IS a right triangle.
     
     def detect_subject(self, question):
         """Detect STEM subject from question"""
-        question_lower = question.lower()
-        scores = {subject: 0 for subject in self.subject_keywords}
+        tokens = set(_WORD_RE.findall(question.lower()))
+        # Plurals count for their keyword ('atoms' -> 'atom', 'forces' -> 'force')
+        tokens.update([t[:-1] for t in tokens if t.endswith('s')] + [t[:-2] for t in tokens if t.endswith('es')])
         
-        for subject, keywords in self.subject_keywords.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    scores[subject] += 1
+        # Count distinct keywords, as repeating a word should not outweigh another subject
+        scores = {subject: len(tokens & words) for subject, words in self._subject_word_sets.items()}
         
         max_score = max(scores.values())
         if max_score == 0:
@@ -756,117 +1308,186 @@ If a² + b² = c², then triangle IS a right triangle.
         
         return answer
     
+    @torch.inference_mode()
     def chat(self, question):
         """Enhanced chat with multiple strategies"""
-        print(f"\n{'='*70}")
-        print(f"💬 Question: {question}")
-        print('='*70)
+        if self.DEBUG:
+            print(f"\n{'='*70}")
+            print(f"💬 Question: {question}")
+            print('='*70)
         
         # Validate
         if not question or len(question.strip()) < 3:
             return {'answer': "⚠️ Please ask a complete question.", 'confidence': 0}
         
         # Add to history
-        self.conversation_history.append(question)
-        if len(self.conversation_history) > self.max_history:
-            self.conversation_history.pop(0)
+        with self._state_lock:
+            self.conversation_history.append(question)
+            if len(self.conversation_history) > self.max_history:
+                self.conversation_history.pop(0)
         
         # Detect subject
         subject = self.detect_subject(question)
         if subject:
-            print(f"📚 Detected subject: {subject.upper()}")
+            if self.DEBUG:
+                print(f"📚 Detected subject: {subject.upper()}")
             self.last_subject = subject
         
-        # STRATEGY 1: Semantic search in local KB (fastest, most relevant)
-        print("\n🔍 Strategy 1: Searching local knowledge base...")
-        if self.semantic_model:
-            kb_subject, kb_topic, kb_score = self.semantic_search_kb(question)
-            
-            if kb_score > self.SIMILARITY_THRESHOLD:
-                print(f"✅ Found in KB: {kb_topic} (confidence: {kb_score:.2%})")
-                content = self.knowledge_base[kb_subject][kb_topic]['content']
-                formatted_answer = self.format_answer_with_steps(content, kb_topic)
-                
-                return {
-                    'answer': formatted_answer,
-                    'subject': kb_subject,
-                    'source': 'Local Knowledge Base',
-                    'confidence': kb_score,
-                    'topic': kb_topic
-                }
+        # A question asked before (ignoring case and spacing) reuses its answer
+        # without touching the encoder
+        key = " ".join(question.lower().split())
+        with self._state_lock:
+            result = self._exact_answers.get(key)
+            if result is not None:
+                self._exact_answers.move_to_end(key)
+        if result is not None:
+            if self.DEBUG:
+                print("⚡ Exact cache hit")
+            return dict(result)
         
-        # STRATEGY 2: Search ScienceQA (best explanations)
-        print("\n🔍 Strategy 2: Searching ScienceQA dataset...")
-        scienceqa_result = self.search_scienceqa(question)
+        # Paraphrases of a recently answered question reuse its answer
+        question_embedding = None
+        result = None
+        if self.semantic_model:
+            question_embedding = self._encode_question(question)
+            result = self._cached_answer(question, question_embedding)
+            if result is not None:
+                if self.DEBUG:
+                    print("⚡ Semantic cache hit")
         
-        if scienceqa_result and scienceqa_result.get('confidence', 0) > self.SIMILARITY_THRESHOLD:
-            return scienceqa_result
+        if result is None:
+            result = self._answer(question, subject)
+            if question_embedding is not None:
+                self._cache_answer(question, question_embedding, result)
         
-        # STRATEGY 3: Search MMLU (high school specific)
-        print("\n🔍 Strategy 3: Searching MMLU dataset...")
-        mmlu_result = self.search_mmlu(question, subject)
+        with self._state_lock:
+            self._exact_answers[key] = dict(result)
+            if len(self._exact_answers) > self.EXACT_CACHE_SIZE:
+                self._exact_answers.popitem(last=False)
+        return result
+    
+    def _answer(self, question, subject):
+        """Run the search strategies in order and build the response dict"""
+        # STRATEGY 1: Semantic search in local KB (fastest, most relevant)
+        if self.DEBUG:
+            print("\n🔍 Strategy 1: Searching local knowledge base...")
+        kb_row, kb_score = None, 0
+        if self.semantic_model:
+            kb_row, kb_score = self.semantic_search_kb(question)
         
-        if mmlu_result and mmlu_result.get('confidence', 0) > self.SIMILARITY_THRESHOLD:
-            return mmlu_result
+        if kb_row is not None and kb_score > self.SIMILARITY_THRESHOLD:
+            kb_topic = self.kb_topics[kb_row]
+            if self.DEBUG:
+                print(f"✅ Found in KB: {kb_topic} (confidence: {kb_score:.2%})")
+                if kb_score >= self.HIGH_CONFIDENCE_THRESHOLD:
+                    # Answered from the KB alone: no dataset search
+                    print("⚡ Fast path: high-confidence KB answer")
+            formatted_answer = self.format_answer_with_steps(self.kb_contents[kb_row], kb_topic)
+            
+            return {
+                'answer': formatted_answer,
+                'subject': self.kb_subjects[kb_row],
+                'source': 'Local Knowledge Base',
+                'confidence': kb_score,
+                'topic': kb_topic
+            }
         
-        # STRATEGY 4: Search SciQ as final fallback
+        # STRATEGIES 2-4: ScienceQA (best explanations), MMLU (high school specific) and
+        # SciQ are searched concurrently; their results are still preferred in that order
+        if self.DEBUG:
+            print("\n🔍 Strategies 2-4: Searching ScienceQA, MMLU and SciQ datasets...")
+        searches = [self._search_pool.submit(self._run_inference, self.search_scienceqa, question),
+                    self._search_pool.submit(self._run_inference, self.search_mmlu, question, subject)]
         if self.datasets.get('sciq'):
-            print("\n🔍 Strategy 4: Searching SciQ dataset...")
-            sciq_result = self._search_sciq_simple(question)
-            if sciq_result:
-                return sciq_result
+            searches.append(self._search_pool.submit(self._run_inference, self._search_sciq_simple, question))
+        scienceqa_result, mmlu_result, *sciq_results = [search.result() for search in searches]
         
-        # Return best available match or helpful message
-        all_results = [r for r in [scienceqa_result, mmlu_result] if r]
+        # Strongest result seen, for the "related information" fallback
+        best_result, best_confidence = None, -1.0
+        for result in (scienceqa_result, mmlu_result):
+            if not result:
+                continue
+            confidence = result.get('confidence', 0)
+            if confidence > self.SIMILARITY_THRESHOLD:
+                return result
+            if confidence > best_confidence:
+                best_result, best_confidence = result, confidence
         
-        if all_results:
-            best_result = max(all_results, key=lambda x: x.get('confidence', 0))
+        if sciq_results and sciq_results[0]:
+            return sciq_results[0]
+        
+        # Return best available match or helpful message
+        if best_result:
             return {
-                'answer': f"⚠️ **Related information** (not an exact match):\n\n{best_result['answer']}",
+                'answer': _RELATED_PREFIX + best_result['answer'],
                 'subject': subject,
                 'source': best_result['source'] + ' (related)',
-                'confidence': best_result.get('confidence', 0) * 0.7,
+                'confidence': best_confidence * 0.7,
                 'matched_question': best_result.get('matched_question')
             }
         
         # No matches found
-        suggestions = self._get_subject_suggestions(subject)
         return {
-            'answer': f"""I couldn't find specific information on that topic. 
-
-**Try asking about:**
-{suggestions}
-
-**Tips for better results:**
-• Be specific (e.g., "What is Newton's first law?" instead of "Tell me about physics")
-• Use standard terminology
-• Break complex questions into smaller parts""",
+            'answer': _NO_MATCH_TEMPLATE.format(suggestions=self._get_subject_suggestions(subject)),
             'subject': subject,
             'source': None,
             'confidence': 0.0
         }
     
+    @staticmethod
+    def _run_inference(fn, *args):
+        """Call fn in inference mode, which is per-thread and so unset in pool workers"""
+        with torch.inference_mode():
+            return fn(*args)
+    
+    def _cached_answer(self, question, embedding):
+        """Copy of the cached result for a near-identical question, or None"""
+        numbers = frozenset(_NUMBER_TOKEN_RE.findall(question.lower()))
+        with self._state_lock:
+            if not self._answer_cache_entries:
+                return None
+            filled = self._answer_cache_matrix[:len(self._answer_cache_entries)]
+            if simsimd is not None and filled.device.type == 'cpu':
+                q = np.ascontiguousarray(embedding.to(filled.dtype).numpy().reshape(1, -1))
+                distances = np.asarray(simsimd.cdist(q, filled.numpy(), metric='cosine')).ravel()
+                row = int(distances.argmin())
+                score = 1.0 - float(distances[row])
+            else:
+                scores = torch.mv(filled, embedding.to(filled.dtype))
+                row = int(scores.argmax())
+                score = float(scores[row])
+            cached_numbers, result = self._answer_cache_entries[row]
+        
+        if score >= self.ANSWER_CACHE_SIMILARITY and cached_numbers == numbers:
+            return dict(result)
+        return None
+    
+    def _cache_answer(self, question, embedding, result):
+        """Remember a result, overwriting the oldest entry once the cache is full"""
+        numbers = frozenset(_NUMBER_TOKEN_RE.findall(question.lower()))
+        with self._state_lock:
+            if self._answer_cache_matrix is None:
+                self._answer_cache_matrix = embedding.new_zeros((self.ANSWER_CACHE_SIZE, embedding.shape[0]))
+            row = self._answer_cache_next
+            self._answer_cache_matrix[row] = embedding
+            entry = (numbers, dict(result))
+            if row < len(self._answer_cache_entries):
+                self._answer_cache_entries[row] = entry
+            else:
+                self._answer_cache_entries.append(entry)
+            self._answer_cache_next = (row + 1) % self.ANSWER_CACHE_SIZE
+    
     def _search_sciq_simple(self, question):
         """Simple SciQ search"""
         try:
-            if self.semantic_model:
-                question_embedding = self.semantic_model.encode(question, convert_to_tensor=True)
-                best_match = None
-                best_score = 0
-                
-                for i, example in enumerate(self.datasets['sciq']):
-                    if i > 2000:
-                        break
-                    
-                    example_embedding = self.semantic_model.encode(example['question'], convert_to_tensor=True)
-                    similarity = util.cos_sim(question_embedding, example_embedding).item()
-                    
-                    if similarity > best_score:
-                        best_score = similarity
-                        best_match = example
+            if self.semantic_model and self.sciq_index is not None:
+                question_embedding = self._encode_question(question)
+                best_row, best_score = self.sciq_index.search(question_embedding)
+                best_match = self.datasets['sciq'][best_row]
                 
                 if best_match and best_score > self.SIMILARITY_THRESHOLD:
-                    print(f"✅ Found in SciQ (similarity: {best_score:.2%})")
+                    if self.DEBUG:
+                        print(f"✅ Found in SciQ (similarity: {best_score:.2%})")
                     return {
                         'answer': best_match['correct_answer'],
                         'source': 'SciQ',
@@ -879,36 +1500,7 @@ If a² + b² = c², then triangle IS a right triangle.
     
     def _get_subject_suggestions(self, subject):
         """Get helpful suggestions based on subject"""
-        suggestions = {
-            'physics': """• Newton's laws of motion
-• Kinetic and potential energy
-• Gravity and weight
-• Force, mass, and acceleration
-• Work and power""",
-            'chemistry': """• Atomic structure
-• Chemical bonding (ionic, covalent)
-• pH and acids/bases
-• Chemical reactions
-• The periodic table""",
-            'biology': """• Photosynthesis
-• Cellular respiration
-• DNA structure
-• Mitosis and meiosis
-• Cell structure""",
-            'math': """• Quadratic equations
-• Pythagorean theorem
-• Linear functions
-• Trigonometry basics
-• Algebra fundamentals"""
-        }
-        
-        if subject and subject in suggestions:
-            return suggestions[subject]
-        
-        return """• Physics: motion, energy, forces
-• Chemistry: atoms, bonding, reactions
-• Biology: cells, DNA, photosynthesis
-• Math: algebra, geometry, calculus"""
+        return _SUBJECT_SUGGESTIONS.get(subject, _DEFAULT_SUGGESTIONS)
     
     def get_practice_problems(self, topic):
         """Suggest practice problems for a topic"""
@@ -917,11 +1509,14 @@ If a² + b² = c², then triangle IS a right triangle.
     
     def show_conversation_context(self):
         """Display recent conversation history"""
-        if not self.conversation_history:
+        with self._state_lock:
+            recent = self.conversation_history[-3:]
+        
+        if not recent:
             return "No conversation history yet."
         
         return "Recent questions:\n" + "\n".join(f"  {i+1}. {q}" 
-                                                   for i, q in enumerate(self.conversation_history[-3:]))
+                                                   for i, q in enumerate(recent))
 
 def main():
     """Main function to run the enhanced chatbot"""